@@ -125,6 +125,9 @@ class ClaudeClient(BaseClient):
 
         logger.debug(f"开始对话：{data}")
 
+        # 在循环外确定响应格式，Provider 已在上方校验过
+        is_openai_format = self.provider in ("openrouter", "oneapi")
+
         if stream:
             async for chunk in self._make_request(headers, data):
                 chunk_str = chunk.decode("utf-8")
@@ -139,7 +142,7 @@ class ClaudeClient(BaseClient):
 
                         try:
                             data = json.loads(json_str)
-                            if self.provider in ("openrouter", "oneapi"):
+                            if is_openai_format:
                                 # OpenRouter/OneApi 格式
                                 content = (
                                     data.get("choices", [{}])[0]
@@ -148,16 +151,12 @@ class ClaudeClient(BaseClient):
                                 )
                                 if content:
                                     yield "answer", content
-                            elif self.provider == "anthropic":
+                            else:
                                 # Anthropic 格式
                                 if data.get("type") == "content_block_delta":
                                     content = data.get("delta", {}).get("text", "")
                                     if content:
                                         yield "answer", content
-                            else:
-                                raise ValueError(
-                                    f"不支持的Claude Provider: {self.provider}"
-                                )
                         except json.JSONDecodeError:
                             continue
         else:
@@ -165,7 +164,7 @@ class ClaudeClient(BaseClient):
             async for chunk in self._make_request(headers, data):
                 try:
                     response = json.loads(chunk.decode("utf-8"))
-                    if self.provider in ("openrouter", "oneapi"):
+                    if is_openai_format:
                         content = (
                             response.get("choices", [{}])[0]
                             .get("message", {})
@@ -173,11 +172,9 @@ class ClaudeClient(BaseClient):
                         )
                         if content:
                             yield "answer", content
-                    elif self.provider == "anthropic":
+                    else:
                         content = response.get("content", [{}])[0].get("text", "")
                         if content:
                             yield "answer", content
-                    else:
-                        raise ValueError(f"不支持的Claude Provider: {self.provider}")
                 except json.JSONDecodeError:
                     continue
@@ -122,7 +122,7 @@ class DeepSeekClient(BaseClient):
                                 # 处理 reasoning_content
                                 if delta.get("reasoning_content"):
                                     content = delta["reasoning_content"]
-                                    logger.debug(f"提取推理内容：{content}")
+                                    logger.debug("提取推理内容：%s", content)
                                     yield "reasoning", content
 
                                 if delta.get("reasoning_content") is None and delta.get(
@@ -139,7 +139,7 @@ class DeepSeekClient(BaseClient):
                                     content = delta["content"]
                                     if content == "":  # 只跳过完全空的字符串
                                         continue
-                                    logger.debug(f"非原生推理内容：{content}")
+                                    logger.debug("非原生推理内容：%s", content)
                                     accumulated_content += content
 
                                     # 检查累积的内容是否包含完整的 think 标签对
@@ -151,13 +151,13 @@ class DeepSeekClient(BaseClient):
 
                                     if "<think>" in content and not is_collecting_think:
                                         # 开始收集推理内容
-                                        logger.debug(f"开始收集推理内容：{content}")
+                                        logger.debug("开始收集推理内容：%s", content)
                                         is_collecting_think = True
                                         yield "reasoning", content
                                     elif is_collecting_think:
                                         if "</think>" in content:
                                             # 推理内容结束
-                                            logger.debug(f"推理内容结束：{content}")
+                                            logger.debug("推理内容结束：%s", content)
                                             is_collecting_think = False
                                             yield "reasoning", content
                                             # 输出空的 content 来触发 Claude 处理
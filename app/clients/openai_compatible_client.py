@@ -1,6 +1,7 @@
 """OpenAI 兼容格式的客户端类,用于处理符合 OpenAI API 格式的服务"""
 
 import json
+import logging
 from typing import AsyncGenerator, Optional, Union, Dict, Any, List
 
 import aiohttp
@@ -153,7 +154,7 @@ class OpenAICompatibleClient(BaseClient):
                         json_str = line[6:].strip()
                         try:
                             response = json.loads(json_str)
-                            logger.debug(f"收到响应数据: {json.dumps(response, ensure_ascii=False)}")
+                            logger.debug("收到响应数据: %s", json_str)
                             
                             if (
                                 "choices" in response
@@ -165,7 +166,7 @@ class OpenAICompatibleClient(BaseClient):
                                 if "delta" in choice and "content" in choice["delta"]:
                                     content = choice["delta"]["content"]
                                     if content:  # 只输出非空内容
-                                        logger.debug(f"收到内容: {content}")
+                                        logger.debug("收到内容: %s", content)
                                         yield "assistant", content
                                 
                                 # 检查是否是结束标记
@@ -175,7 +176,10 @@ class OpenAICompatibleClient(BaseClient):
                                     return
                                 
                                 # 记录其他类型的响应
-                                if "delta" not in choice or "content" not in choice["delta"]:
+                                if (
+                                    ("delta" not in choice or "content" not in choice["delta"])
+                                    and logger.isEnabledFor(logging.DEBUG)
+                                ):
                                     logger.debug(f"收到不包含内容的响应: {json.dumps(choice, ensure_ascii=False)}")
                         except json.JSONDecodeError as e:
                             logger.error(f"JSON解析错误: {str(e)}, 原始数据: {json_str}")
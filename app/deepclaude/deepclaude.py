@@ -1,19 +1,55 @@
 """DeepClaude 服务，用于协调 DeepSeek 和 Claude API 的调用"""
 
 import asyncio
-import json
+import functools
 import time
 from typing import AsyncGenerator
 
 import tiktoken
 
 from app.clients import ClaudeClient, DeepSeekClient
+from app.utils.completion import (
+    CHUNK_CONTENT,
+    REASONING_FAILED,
+    build_error_chunk,
+    make_chunk_encoder,
+    new_chat_id,
+)
 from app.utils.logger import logger
 
 
+@functools.lru_cache(maxsize=8)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    """获取并缓存 tiktoken 编码器，避免每次请求重复查找和构建 BPE 表
+
+    Args:
+        model_name: 模型名称
+
+    Returns:
+        tiktoken.Encoding: 对应模型的编码器
+    """
+    return tiktoken.encoding_for_model(model_name)
+
+
+def count_tokens_batch(texts: list[str]) -> list[list[int]]:
+    """使用 gpt-4o 编码器批量编码文本，用于计算 token 数量
+
+    编码器的首次加载可能需要读取或下载 BPE 文件，应与编码一起放到线程中执行
+
+    Args:
+        texts: 待编码的文本列表
+
+    Returns:
+        list[list[int]]: 每段文本对应的 token 列表
+    """
+    return get_encoding("gpt-4o").encode_ordinary_batch(texts)
+
+
 class DeepClaude:
     """处理 DeepSeek 和 Claude API 的流式输出衔接"""
 
+    __slots__ = ("system_config", "deepseek_client", "claude_client", "is_origin_reasoning")
+
     def __init__(
         self,
         deepseek_api_key: str,
@@ -84,224 +120,111 @@ class DeepClaude:
             }
         """
         # 生成唯一的会话ID和时间戳
-        chat_id = f"chatcmpl-{hex(int(time.time() * 1000))[2:]}"
+        chat_id = new_chat_id()
         created_time = int(time.time())
 
-        # 创建队列，用于收集输出数据
-        output_queue = asyncio.Queue()
-        # 队列，用于传递 DeepSeek 推理内容给 Claude
-        claude_queue = asyncio.Queue()
-
         # 用于存储 DeepSeek 的推理累积内容
         reasoning_content = []
 
-        async def process_deepseek():
-            logger.info(f"开始处理 DeepSeek 流，使用模型：{deepseek_model}")
-            try:
-                async for content_type, content in self.deepseek_client.stream_chat(
-                    messages, deepseek_model, self.is_origin_reasoning
-                ):
-                    if content_type == "reasoning":
-                        reasoning_content.append(content)
-                        response = {
-                            "id": chat_id,
-                            "object": "chat.completion.chunk",
-                            "created": created_time,
-                            "model": deepseek_model,
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": {
-                                        "role": "assistant",
-                                        "reasoning_content": content,
-                                        "content": "",
-                                    },
-                                }
-                            ],
-                        }
-                        await output_queue.put(
-                            f"data: {json.dumps(response)}\n\n".encode("utf-8")
-                        )
-                    elif content_type == "content":
-                        # 当收到 content 类型时，将完整的推理内容发送到 claude_queue，并结束 DeepSeek 流处理
-                        logger.info(
-                            f"DeepSeek 推理完成，收集到的推理内容长度：{len(''.join(reasoning_content))}"
-                        )
-                        await claude_queue.put("".join(reasoning_content))
-                        break
-            except Exception as e:
-                logger.error(f"处理 DeepSeek 流时发生错误: {e}")
-                # 构造错误响应
-                error_message = str(e)
-                error_info = {
-                    "message": error_message,
-                    "type": "api_error",
-                    "code": "invalid_request_error"
-                }
-                
-                # 处理常见的错误信息
-                if "Input length" in error_message:
-                    error_info["message"] = "输入的上下文内容过长，超过了模型的最大处理长度限制。请减少输入内容或分段处理。"
-                    error_info["message_zh"] = "输入的上下文内容过长，超过了模型的最大处理长度限制。请减少输入内容或分段处理。"
-                    error_info["message_en"] = error_message
-                elif "InvalidParameter" in error_message:
-                    error_info["message"] = "请求参数无效，请检查输入内容。"
-                    error_info["message_zh"] = "请求参数无效，请检查输入内容。"
-                    error_info["message_en"] = error_message
-                elif "BadRequest" in error_message:
-                    error_info["message"] = "请求格式错误，请检查输入内容。"
-                    error_info["message_zh"] = "请求格式错误，请检查输入内容。"
-                    error_info["message_en"] = error_message
-
-                error_response = {
-                    "id": chat_id,
-                    "object": "chat.completion.chunk",
-                    "created": created_time,
-                    "model": deepseek_model,
-                    "error": error_info
-                }
-                await output_queue.put(
-                    f"data: {json.dumps(error_response)}\n\n".encode("utf-8")
-                )
-                # 发送结束标记
-                await output_queue.put(b"data: [DONE]\n\n")
-                # 标记任务结束
-                await output_queue.put(None)
-                return
-            # 用 None 标记 DeepSeek 任务结束
-            logger.info("DeepSeek 任务处理完成，标记结束")
-            await output_queue.put(None)
-
-        async def process_claude():
-            try:
-                logger.info("等待获取 DeepSeek 的推理内容...")
-                reasoning = await claude_queue.get()
-                logger.debug(
-                    f"获取到推理内容，内容长度：{len(reasoning) if reasoning else 0}"
-                )
-                if not reasoning:
-                    logger.warning("未能获取到有效的推理内容，将使用默认提示继续")
-                    reasoning = "获取推理内容失败"
-
-                # 构造 Claude 的输入消息
-                claude_messages = messages.copy()
-                combined_content = f"""
+        # 预先生成推理和回答数据块的固定部分，每个数据块只需编码内容
+        encode_reasoning = make_chunk_encoder(
+            chat_id,
+            created_time,
+            deepseek_model,
+            {"role": "assistant", "reasoning_content": CHUNK_CONTENT, "content": ""},
+        )
+        encode_answer = make_chunk_encoder(
+            chat_id, created_time, claude_model, {"role": "assistant", "content": CHUNK_CONTENT}
+        )
+
+        # 1. 处理 DeepSeek 流，直接输出推理内容
+        logger.info(f"开始处理 DeepSeek 流，使用模型：{deepseek_model}")
+        try:
+            async for content_type, content in self.deepseek_client.stream_chat(
+                messages, deepseek_model, self.is_origin_reasoning
+            ):
+                if content_type == "reasoning":
+                    reasoning_content.append(content)
+                    yield encode_reasoning(content)
+                elif content_type == "content":
+                    # 当收到 content 类型时，推理阶段结束，停止 DeepSeek 流处理
+                    logger.info(
+                        f"DeepSeek 推理完成，收集到的推理内容长度：{len(''.join(reasoning_content))}"
+                    )
+                    break
+        except Exception as e:
+            logger.error(f"处理 DeepSeek 流时发生错误: {e}")
+            yield build_error_chunk(chat_id, created_time, deepseek_model, e)
+            # 发送结束标记
+            yield b"data: [DONE]\n\n"
+            return
+        logger.info("DeepSeek 任务处理完成")
+
+        # 2. 使用推理内容处理 Claude 流
+        try:
+            reasoning = "".join(reasoning_content)
+            logger.debug(f"获取到推理内容，内容长度：{len(reasoning)}")
+            if not reasoning:
+                logger.warning("未能获取到有效的推理内容，将使用默认提示继续")
+                reasoning = REASONING_FAILED
+
+            # 构造 Claude 的输入消息
+            claude_messages = messages.copy()
+            combined_content = f"""
                 ******The above is user information*****
 The following is the reasoning process of another model:****\n{reasoning}\n\n ****
 Based on this reasoning, combined with your knowledge, when the current reasoning conflicts with your knowledge, you are more confident that you can adopt your own knowledge, which is completely acceptable. Please provide the user with a complete answer directly. You do not need to repeat the request or make your own reasoning. Please be sure to reply completely:"""
 
-                # 提取 system message 并同时过滤掉 system messages
-                system_content = ""
-                non_system_messages = []
-                for message in claude_messages:
-                    if message.get("role", "") == "system":
-                        system_content += message.get("content", "") + "\n"
-                    else:
-                        non_system_messages.append(message)
-                
-                # 更新消息列表为不包含 system 消息的列表
-                claude_messages = non_system_messages
-
-                # 检查过滤后的消息列表是否为空
-                if not claude_messages:
-                    raise ValueError("消息列表为空，无法处理 Claude 请求")
-
-                # 获取最后一个消息并检查其角色
-                last_message = claude_messages[-1]
-                if last_message.get("role", "") != "user":
-                    raise ValueError("最后一个消息的角色不是用户，无法处理请求")
-
-                # 修改最后一个消息的内容
-                original_content = last_message["content"]
-                fixed_content = f"Here's my original input:\n{original_content}\n\n{combined_content}"
-                last_message["content"] = fixed_content
-
-                logger.info(
-                    f"开始处理 Claude 流，使用模型: {claude_model}, 提供商: {self.claude_client.provider}"
-                )
-
-                # 检查 system_prompt
-                system_content = system_content.strip() if system_content else None
-                if system_content:
-                    logger.debug(f"使用系统提示: {system_content[:100]}...")
-
-                async for content_type, content in self.claude_client.stream_chat(
-                    messages=claude_messages,
-                    model_arg=model_arg,
-                    model=claude_model,
-                    system_prompt=system_content
-                ):
-                    if content_type == "answer":
-                        response = {
-                            "id": chat_id,
-                            "object": "chat.completion.chunk",
-                            "created": created_time,
-                            "model": claude_model,
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": {"role": "assistant", "content": content},
-                                }
-                            ],
-                        }
-                        await output_queue.put(
-                            f"data: {json.dumps(response)}\n\n".encode("utf-8")
-                        )
-            except Exception as e:
-                logger.error(f"处理 Claude 流时发生错误: {e}")
-                # 构造错误响应
-                error_message = str(e)
-                error_info = {
-                    "message": error_message,
-                    "type": "api_error",
-                    "code": "invalid_request_error"
-                }
-                
-                # 处理常见的错误信息
-                if "Input length" in error_message:
-                    error_info["message"] = "输入的上下文内容过长，超过了模型的最大处理长度限制。请减少输入内容或分段处理。"
-                    error_info["message_zh"] = "输入的上下文内容过长，超过了模型的最大处理长度限制。请减少输入内容或分段处理。"
-                    error_info["message_en"] = error_message
-                elif "InvalidParameter" in error_message:
-                    error_info["message"] = "请求参数无效，请检查输入内容。"
-                    error_info["message_zh"] = "请求参数无效，请检查输入内容。"
-                    error_info["message_en"] = error_message
-                elif "BadRequest" in error_message:
-                    error_info["message"] = "请求格式错误，请检查输入内容。"
-                    error_info["message_zh"] = "请求格式错误，请检查输入内容。"
-                    error_info["message_en"] = error_message
-
-                error_response = {
-                    "id": chat_id,
-                    "object": "chat.completion.chunk",
-                    "created": created_time,
-                    "model": claude_model,
-                    "error": error_info
-                }
-                await output_queue.put(
-                    f"data: {json.dumps(error_response)}\n\n".encode("utf-8")
-                )
-                # 发送结束标记
-                await output_queue.put(b"data: [DONE]\n\n")
-                # 标记任务结束
-                await output_queue.put(None)
-                return
-            # 用 None 标记 Claude 任务结束
-            logger.info("Claude 任务处理完成，标记结束")
-            await output_queue.put(None)
-
-        # 创建并发任务
-        asyncio.create_task(process_deepseek())
-        asyncio.create_task(process_claude())
-
-        # 等待两个任务完成，通过计数判断
-        finished_tasks = 0
-        while finished_tasks < 2:
-            item = await output_queue.get()
-            if item is None:
-                finished_tasks += 1
-            else:
-                yield item
+            # 提取 system message 并同时过滤掉 system messages
+            system_content = ""
+            non_system_messages = []
+            for message in claude_messages:
+                if message.get("role", "") == "system":
+                    system_content += message.get("content", "") + "\n"
+                else:
+                    non_system_messages.append(message)
+            
+            # 更新消息列表为不包含 system 消息的列表
+            claude_messages = non_system_messages
+
+            # 检查过滤后的消息列表是否为空
+            if not claude_messages:
+                raise ValueError("消息列表为空，无法处理 Claude 请求")
+
+            # 获取最后一个消息并检查其角色
+            last_message = claude_messages[-1]
+            if last_message.get("role", "") != "user":
+                raise ValueError("最后一个消息的角色不是用户，无法处理请求")
+
+            # 修改最后一个消息的内容
+            original_content = last_message["content"]
+            fixed_content = f"Here's my original input:\n{original_content}\n\n{combined_content}"
+            last_message["content"] = fixed_content
+
+            logger.info(
+                f"开始处理 Claude 流，使用模型: {claude_model}, 提供商: {self.claude_client.provider}"
+            )
+
+            # 检查 system_prompt
+            system_content = system_content.strip() if system_content else None
+            if system_content:
+                logger.debug(f"使用系统提示: {system_content[:100]}...")
+
+            async for content_type, content in self.claude_client.stream_chat(
+                messages=claude_messages,
+                model_arg=model_arg,
+                model=claude_model,
+                system_prompt=system_content
+            ):
+                if content_type == "answer":
+                    yield encode_answer(content)
+        except Exception as e:
+            logger.error(f"处理 Claude 流时发生错误: {e}")
+            yield build_error_chunk(chat_id, created_time, claude_model, e)
+            # 发送结束标记
+            yield b"data: [DONE]\n\n"
+            return
+        logger.info("Claude 任务处理完成")
 
         # 发送结束标记
         yield b"data: [DONE]\n\n"
@@ -324,7 +247,7 @@ Based on this reasoning, combined with your knowledge, when the current reasonin
         Returns:
             dict: OpenAI 格式的完整响应
         """
-        chat_id = f"chatcmpl-{hex(int(time.time() * 1000))[2:]}"
+        chat_id = new_chat_id()
         created_time = int(time.time())
         reasoning_content = []
 
@@ -339,7 +262,7 @@ Based on this reasoning, combined with your knowledge, when the current reasonin
                     break
         except Exception as e:
             logger.error(f"获取 DeepSeek 推理内容时发生错误: {e}")
-            reasoning_content = ["获取推理内容失败"]
+            reasoning_content = [REASONING_FAILED]
 
         # 2. 构造 Claude 的输入消息
         reasoning = "".join(reasoning_content)
@@ -371,19 +294,13 @@ Based on this reasoning, combined with your knowledge, when the current reasonin
             )
             last_message["content"] = fixed_content
 
-        # 拼接所有 content 为一个字符串，计算 token
-        token_content = "\n".join(
-            [message.get("content", "") for message in claude_messages]
-        )
-        encoding = tiktoken.encoding_for_model("gpt-4o")
-        input_tokens = encoding.encode(token_content)
-        logger.debug(f"输入 Tokens: {len(input_tokens)}")
+        # 收集所有 content，用于计算 token
+        token_contents = [message.get("content", "") for message in claude_messages]
 
         logger.debug("claude messages: " + str(claude_messages))
         # 3. 获取 Claude 的非流式响应
         try:
             answer = ""
-            output_tokens = []  # 初始化 output_tokens
             
             # 检查 system_prompt
             system_content = system_content.strip() if system_content else None
@@ -399,8 +316,16 @@ Based on this reasoning, combined with your knowledge, when the current reasonin
             ):
                 if content_type == "answer":
                     answer += content
-                    output_tokens = encoding.encode(answer)  # 更新 output_tokens
-                logger.debug(f"输出 Tokens: {len(output_tokens)}")
+
+            # 逐条消息和输出一次性批量编码，计算 token
+            # 加载编码器和编码都在线程池中执行，避免阻塞事件循环
+            *message_tokens, output_tokens = await asyncio.to_thread(
+                count_tokens_batch, token_contents + [answer]
+            )
+            # 消息之间按换行拼接，每个换行计 1 个 token
+            prompt_tokens = sum(len(tokens) for tokens in message_tokens) + len(message_tokens) - 1
+            completion_tokens = len(output_tokens)
+            logger.debug(f"输入 Tokens: {prompt_tokens}, 输出 Tokens: {completion_tokens}")
 
             # 4. 构造 OpenAI 格式的响应
             return {
@@ -420,9 +345,9 @@ Based on this reasoning, combined with your knowledge, when the current reasonin
                     }
                 ],
                 "usage": {
-                    "prompt_tokens": len(input_tokens),
-                    "completion_tokens": len(output_tokens),
-                    "total_tokens": len(input_tokens + output_tokens),
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
                 },
             }
         except Exception as e:
@@ -1,8 +1,12 @@
 import os
+import asyncio
 import logging
 import json
+import functools
 import aiohttp
 import time
+from contextlib import asynccontextmanager
+from datetime import datetime
 
 from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,6 +14,7 @@ from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.utils.auth import verify_api_key
+from app.utils.completion import new_chat_id
 from app.utils.logger import logger
 from app.manager import model_manager
 
@@ -33,9 +38,20 @@ logger.setLevel(getattr(logging, log_level))
 
 # 静态文件目录
 static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
+# 配置页面文件路径
+config_html_path = os.path.join(static_dir, "index.html")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """服务启动时预热模型实例，预热失败不影响服务启动"""
+    try:
+        model_manager.warmup()
+    except Exception as e:
+        logger.warning(f"模型预热失败: {e}")
+    yield
 
 # 创建 FastAPI 应用
-app = FastAPI(title="DeepClaude API")
+app = FastAPI(title="DeepClaude API", lifespan=lifespan)
 
 # 配置 CORS
 app.add_middleware(
@@ -53,6 +69,23 @@ app.mount("/static", StaticFiles(directory=static_dir), name="static")
 logger.debug("当前日志级别为 DEBUG")
 logger.info("开始请求")
 
+def handle_errors(action: str):
+    """捕获接口中的异常，记录日志并返回错误信息
+
+    Args:
+        action: 出错时日志中描述的操作，例如 "获取配置"
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"{action}时发生错误: {e}")
+                return {"error": str(e)}
+        return wrapper
+    return decorator
+
 @app.get("/", dependencies=[Depends(verify_api_key)])
 async def root():
     logger.info("访问了根路径")
@@ -108,7 +141,7 @@ async def chat_completions(request: Request):
                     if body.get("stream", True):
                         async def error_stream(err_msg):
                             error_response = {
-                                "id": f"chatcmpl-{hex(int(time.time() * 1000))[2:]}",
+                                "id": new_chat_id(),
                                 "object": "chat.completion.chunk",
                                 "created": int(time.time()),
                                 "model": body.get("model", "unknown"),
@@ -135,7 +168,7 @@ async def chat_completions(request: Request):
         if body.get("stream", True):
             async def error_stream(err_msg):
                 error_response = {
-                    "id": f"chatcmpl-{hex(int(time.time() * 1000))[2:]}",
+                    "id": new_chat_id(),
                     "object": "chat.completion.chunk",
                     "created": int(time.time()),
                     "model": body.get("model", "unknown"),
@@ -158,110 +191,88 @@ async def chat_completions(request: Request):
             )
 
 @app.get("/v1/models", dependencies=[Depends(verify_api_key)])
+@handle_errors("获取模型列表")
 async def list_models():
     """获取可用模型列表
 
     使用 ModelManager 获取从配置文件中读取的模型列表
     返回格式遵循 OpenAI API 标准
     """
-    try:
-        models = model_manager.get_model_list()
-        return {"object": "list", "data": models}
-    except Exception as e:
-        logger.error(f"获取模型列表时发生错误: {e}")
-        return {"error": str(e)}
+    models = model_manager.get_model_list()
+    return {"object": "list", "data": models}
 
 
 @app.get("/config")
+@handle_errors("返回配置页面")
 async def config_page():
     """配置页面
 
     返回配置页面的 HTML
     """
-    try:
-        html_path = os.path.join(static_dir, "index.html")
-        if not os.path.exists(html_path):
-            logger.error(f"HTML 文件不存在: {html_path}")
-            return {"error": "配置页面文件不存在"}
-        return FileResponse(html_path)
-    except Exception as e:
-        logger.error(f"返回配置页面时发生错误: {e}")
-        return {"error": str(e)}
+    if not os.path.exists(config_html_path):
+        logger.error(f"HTML 文件不存在: {config_html_path}")
+        return {"error": "配置页面文件不存在"}
+    return FileResponse(config_html_path)
 
 @app.get("/v1/config", dependencies=[Depends(verify_api_key)])
+@handle_errors("获取配置")
 async def get_config():
     """获取模型配置
 
     返回当前的模型配置数据
     """
-    try:
-        # 使用 ModelManager 获取配置
-        config = model_manager.get_config()
-        return config
-    except Exception as e:
-        logger.error(f"获取配置时发生错误: {e}")
-        return {"error": str(e)}
+    # 使用 ModelManager 获取配置，可能需要重新读取配置文件，放到线程中执行
+    return await asyncio.to_thread(model_manager.get_config)
 
 @app.post("/v1/config", dependencies=[Depends(verify_api_key)])
+@handle_errors("更新配置")
 async def update_config(request: Request):
     """更新模型配置
 
     接收并保存新的模型配置数据
     """
-    try:
-        # 获取请求体
-        body = await request.json()
+    # 获取请求体
+    body = await request.json()
 
-        # 使用 ModelManager 更新配置
-        model_manager.update_config(body)
+    # 使用 ModelManager 更新配置，写入配置文件放到线程中执行，避免阻塞事件循环
+    await asyncio.to_thread(model_manager.update_config, body)
 
-        return {"message": "配置已更新"}
-    except Exception as e:
-        logger.error(f"更新配置时发生错误: {e}")
-        return {"error": str(e)}
+    return {"message": "配置已更新"}
 
 @app.get("/v1/config/export", dependencies=[Depends(verify_api_key)])
+@handle_errors("导出配置")
 async def export_config():
     """导出模型配置
 
     返回当前完整的模型配置数据，可用于备份和迁移
     """
-    try:
-        # 使用 ModelManager 导出配置
-        config = model_manager.export_config()
-
-        # 设置响应头，建议浏览器下载文件
-        from fastapi.responses import JSONResponse
-        from datetime import datetime
+    # 使用 ModelManager 导出配置，可能需要重新读取配置文件，放到线程中执行
+    config = await asyncio.to_thread(model_manager.export_config)
 
-        filename = f"deepclaude_config_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        headers = {
-            "Content-Disposition": f"attachment; filename={filename}",
-            "Content-Type": "application/json"
-        }
+    # 设置响应头，建议浏览器下载文件
+    filename = f"deepclaude_config_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Content-Type": "application/json"
+    }
 
-        return JSONResponse(content=config, headers=headers)
-    except Exception as e:
-        logger.error(f"导出配置时发生错误: {e}")
-        return {"error": str(e)}
+    return JSONResponse(content=config, headers=headers)
 
 @app.post("/v1/config/import", dependencies=[Depends(verify_api_key)])
+@handle_errors("导入配置")
 async def import_config(request: Request):
     """导入模型配置
 
     接收并验证配置文件，然后导入到系统中
     """
-    try:
-        # 获取请求体
-        body = await request.json()
-
-        # 使用 ModelManager 导入配置
-        model_manager.import_config(body)
+    # 获取请求体
+    body = await request.json()
 
-        return {"message": "配置导入成功"}
+    try:
+        # 使用 ModelManager 导入配置，写入配置文件放到线程中执行
+        await asyncio.to_thread(model_manager.import_config, body)
     except ValueError as e:
         logger.error(f"配置验证失败: {e}")
         return {"error": str(e)}
-    except Exception as e:
-        logger.error(f"导入配置时发生错误: {e}")
-        return {"error": str(e)}
+
+    return {"message": "配置导入成功"}
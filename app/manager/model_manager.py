@@ -2,50 +2,183 @@
 
 import os
 import json
+import threading
+import time
+from datetime import datetime
 from typing import Dict, Any, Tuple, List, AsyncGenerator, Optional
 
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from app.deepclaude.deepclaude import DeepClaude
+from app.deepclaude.deepclaude import DeepClaude, get_encoding
 from app.openai_composite import OpenAICompatibleComposite
+from app.utils.completion import REASONING_FAILED, new_chat_id
 from app.utils.logger import logger
+from app.utils.model_cache import ModelInstanceCache, ResponseCache
+
+
+# 表示开启的字符串取值，常见写法可以直接命中，无需 strip/lower
+_TRUTHY = frozenset({"1", "true", "True", "TRUE", "yes", "Yes", "YES", "on", "On", "ON"})
+
+
+def _is_enabled(value: Any) -> bool:
+    """将配置中的开关值转换为布尔值，兼容手动编辑配置时写成字符串的 "true"/"false"
+
+    Args:
+        value: 配置中的开关值
+
+    Returns:
+        bool: 开关是否开启
+    """
+    if isinstance(value, str):
+        return value in _TRUTHY or value.strip().lower() in _TRUTHY
+    return bool(value)
+
+
+def _is_complete_response(response: Dict[str, Any]) -> bool:
+    """判断非流式响应是否正常完成，只有正常完成的响应才能被缓存
+
+    Args:
+        response: 组合模型返回的完整响应
+
+    Returns:
+        bool: 是否正常结束且包含有效的推理内容和回答
+    """
+    choices = response.get("choices")
+    if not choices:
+        return False
+    choice = choices[0]
+    message = choice.get("message", {})
+    return (
+        choice.get("finish_reason") == "stop"
+        and bool(message.get("content"))
+        and message.get("reasoning_content") not in (None, "", REASONING_FAILED)
+    )
 
 
 class ModelManager:
     """模型管理器，负责创建和管理模型实例，处理请求参数"""
 
+    __slots__ = (
+        "config_path",
+        "config",
+        "_config_loaded_at",
+        "_config_mtime",
+        "_config_lock",
+        "_config_version",
+        "model_instances",
+        "_model_details_cache",
+        "_model_list_cache",
+        "_response_cache",
+        "is_origin_reasoning",
+    )
+
+    # 配置快照的有效期(秒)，过期后才会从文件重新加载
+    CONFIG_TTL = 30
+
     def __init__(self):
         """初始化模型管理器"""
         # 配置文件路径
         self.config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "model_manager", "model_configs.json")
-        # 加载模型配置
+        # 配置锁，配置接口在线程池中执行，重新加载和保存配置时需持有该锁，避免并发读写配置文件
+        self._config_lock = threading.Lock()
+        # 配置版本号，每次替换配置时递增，用于标记派生缓存所基于的配置
+        self._config_version = 0
+        # 配置文件的修改时间，用于判断文件是否发生变化
+        self._config_mtime = self._get_config_mtime()
+        # 加载模型配置，加载失败时使用空配置启动
         self.config = self._load_config()
+        if self.config is None:
+            self.config = {"reasoner_models": {}, "target_models": {}, "composite_models": {}, "proxy": {"proxy_open": False}}
+        # 配置快照的检查时间
+        self._config_loaded_at = time.monotonic()
         # 模型实例缓存
-        self.model_instances = {}
+        self.model_instances = ModelInstanceCache()
+        # 模型详细配置缓存，值为 (配置版本号, 推理模型配置, 目标模型配置)，配置变更时清空
+        self._model_details_cache: Dict[str, Tuple[int, Dict[str, Any], Dict[str, Any]]] = {}
+        # 可用模型列表缓存，值为 (配置版本号, 模型列表)，配置变更时清空
+        self._model_list_cache: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+        # 非流式响应缓存，需在系统配置中开启 response_cache
+        self._response_cache = ResponseCache()
         # 是否原生支持推理字段
         self.is_origin_reasoning = os.getenv("IS_ORIGIN_REASONING", "True").lower() == "true"
 
-    def _load_config(self) -> Dict[str, Any]:
+    def _load_config(self) -> Optional[Dict[str, Any]]:
         """加载模型配置文件
 
         Returns:
-            Dict[str, Any]: 配置信息
+            Optional[Dict[str, Any]]: 配置信息，文件不存在、读取失败或内容无效时返回 None
         """
         try:
             with open(self.config_path, "r", encoding="utf-8") as f:
                 config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError("配置必须是字典")
             logger.info(f"成功加载模型配置，包含 {len(config.get('composite_models', {}))} 个组合模型")
             return config
         except Exception as e:
             logger.error(f"加载模型配置失败: {e}")
-            # 返回空配置
-            return {"reasoner_models": {}, "target_models": {}, "composite_models": {}, "proxy": {"proxy_open": False}}
+            return None
+
+    def _get_config_mtime(self) -> Optional[int]:
+        """获取配置文件的修改时间
+
+        Returns:
+            Optional[int]: 修改时间(纳秒)，文件不存在时返回 None
+        """
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh_config(self) -> Dict[str, Any]:
+        """配置快照过期时检查配置文件，只有文件发生变化才重新加载
+
+        Returns:
+            Dict[str, Any]: 当前配置
+        """
+        now = time.monotonic()
+        if now - self._config_loaded_at > self.CONFIG_TTL:
+            # 与 update_config 互斥，避免读到正在写入的配置文件，或用旧配置覆盖刚保存的配置
+            with self._config_lock:
+                if now - self._config_loaded_at > self.CONFIG_TTL:
+                    self._config_loaded_at = now
+                    mtime = self._get_config_mtime()
+                    if mtime != self._config_mtime:
+                        # 加载失败时（例如文件被外部程序写入到一半）保留当前配置，也不记录新的修改时间，下次检查时重试
+                        config = self._load_config()
+                        if config is not None:
+                            self._apply_config(config, mtime)
+        return self.config
+
+    def _apply_config(self, config: Dict[str, Any], mtime: Optional[int]) -> None:
+        """替换当前配置并清空派生缓存，调用方需持有 _config_lock
+
+        先替换配置再递增版本号，读取方先读版本号再读配置，
+        因此缓存项标记的版本号不会比其实际使用的配置更新
 
-    def get_composite_model_config(self, model_name: str) -> Dict[str, Any]:
+        Args:
+            config: 新配置
+            mtime: 配置文件对应的修改时间
+        """
+        self.config = config
+        self._config_version += 1
+        self._config_mtime = mtime
+        self._config_loaded_at = time.monotonic()
+        self._clear_config_caches()
+
+    def _clear_config_caches(self) -> None:
+        """清空由配置派生出的缓存，配置变更后调用"""
+        self.model_instances.clear()
+        self._model_details_cache = {}
+        self._model_list_cache = None
+        self._response_cache.clear()
+
+    def get_composite_model_config(self, model_name: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """获取组合模型配置
 
         Args:
             model_name: 模型名称
+            config: 要查找的配置，默认为当前配置
 
         Returns:
             Dict[str, Any]: 组合模型配置
@@ -53,7 +186,9 @@ class ModelManager:
         Raises:
             ValueError: 模型不存在或无效
         """
-        composite_models = self.config.get("composite_models", {})
+        if config is None:
+            config = self.config
+        composite_models = config.get("composite_models", {})
         if model_name not in composite_models:
             raise ValueError(f"模型 '{model_name}' 不存在")
 
@@ -75,12 +210,22 @@ class ModelManager:
         Raises:
             ValueError: 模型不存在或无效
         """
+        # 先读版本号再读配置，配置在其他线程中被替换时，缓存项只会被标记为更旧的版本
+        version = self._config_version
+        details_cache = self._model_details_cache
+        config = self.config
+
+        # 配置未变更时直接返回缓存的结果
+        cached = details_cache.get(model_name)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
         # 获取组合模型配置
-        composite_config = self.get_composite_model_config(model_name)
+        composite_config = self.get_composite_model_config(model_name, config)
         
         # 获取推理模型配置
         reasoner_model_name = composite_config.get("reasoner_models")
-        reasoner_models = self.config.get("reasoner_models", {})
+        reasoner_models = config.get("reasoner_models", {})
         if reasoner_model_name not in reasoner_models:
             raise ValueError(f"推理模型 '{reasoner_model_name}' 不存在")
         
@@ -90,7 +235,7 @@ class ModelManager:
         
         # 获取目标模型配置
         target_model_name = composite_config.get("target_models")
-        target_models = self.config.get("target_models", {})
+        target_models = config.get("target_models", {})
         if target_model_name not in target_models:
             raise ValueError(f"目标模型 '{target_model_name}' 不存在")
         
@@ -98,37 +243,63 @@ class ModelManager:
         if not target_config.get("is_valid", False):
             raise ValueError(f"目标模型 '{target_model_name}' 当前不可用")
         
+        details_cache[model_name] = (version, reasoner_config, target_config)
         return reasoner_config, target_config
 
-    def _get_model_instance(self, model_name: str) -> Any:
+    def _get_model_instance(
+        self,
+        model_name: str,
+        reasoner_config: Dict[str, Any],
+        target_config: Dict[str, Any],
+        config_version: int,
+    ) -> Any:
         """获取或创建模型实例
 
         Args:
             model_name: 模型名称
+            reasoner_config: 推理模型配置
+            target_config: 目标模型配置
+            config_version: 获取模型配置前读取的配置版本号，实例按模型名称和版本号缓存
 
         Returns:
             Any: 模型实例
+        """
+        return self.model_instances.get_or_create(
+            (model_name, config_version),
+            lambda: self._create_model_instance(model_name, reasoner_config, target_config),
+        )
+
+    def _create_model_instance(
+        self,
+        model_name: str,
+        reasoner_config: Dict[str, Any],
+        target_config: Dict[str, Any],
+    ) -> Any:
+        """创建模型实例
 
-        Raises:
-            ValueError: 模型不存在或无效
+        Args:
+            model_name: 模型名称
+            reasoner_config: 推理模型配置
+            target_config: 目标模型配置
+
+        Returns:
+            Any: 模型实例
         """
-        # 如果已经有缓存的实例，直接返回
-        if model_name in self.model_instances:
-            return self.model_instances[model_name]
-        
-        # 获取模型详细配置
-        reasoner_config, target_config = self.get_model_details(model_name)
-        
         # 获取代理配置
         proxy_config = self.config.get("proxy", {})
         proxy = None
-        if proxy_config.get("proxy_open", False):
+        if _is_enabled(proxy_config.get("proxy_open", False)):
             proxy = proxy_config.get("proxy_address")
             logger.info(f"模型 {model_name} 将使用代理: {proxy}")
         
         # 默认设置为True, 和默认行为保持一致（只要全局开始proxy_open, 则模型默认开启proxy_open）
-        reasoner_proxy = proxy if reasoner_config.get('proxy_open', True) else None
-        target_proxy = proxy if target_config.get('proxy_open', True) else None
+        reasoner_proxy = proxy if _is_enabled(reasoner_config.get('proxy_open', True)) else None
+        target_proxy = proxy if _is_enabled(target_config.get('proxy_open', True)) else None
+        
+        # 拼接请求地址
+        reasoner_api_url = f"{reasoner_config['api_base_url']}/{reasoner_config['api_request_address']}"
+        target_api_url = f"{target_config['api_base_url']}/{target_config['api_request_address']}"
+        is_origin_reasoning = reasoner_config.get("is_origin_reasoning", self.is_origin_reasoning)
         
         # 获取系统配置
         system_config = self.config.get("system", {})
@@ -139,10 +310,10 @@ class ModelManager:
             instance = DeepClaude(
                 deepseek_api_key=reasoner_config["api_key"],
                 claude_api_key=target_config["api_key"],
-                deepseek_api_url=f"{reasoner_config['api_base_url']}/{reasoner_config['api_request_address']}",
-                claude_api_url=f"{target_config['api_base_url']}/{target_config['api_request_address']}",
+                deepseek_api_url=reasoner_api_url,
+                claude_api_url=target_api_url,
                 claude_provider="anthropic",
-                is_origin_reasoning=reasoner_config.get("is_origin_reasoning", self.is_origin_reasoning),
+                is_origin_reasoning=is_origin_reasoning,
                 reasoner_proxy=reasoner_proxy,
                 target_proxy=target_proxy,
                 system_config=system_config,
@@ -152,18 +323,53 @@ class ModelManager:
             instance = OpenAICompatibleComposite(
                 deepseek_api_key=reasoner_config["api_key"],
                 openai_api_key=target_config["api_key"],
-                deepseek_api_url=f"{reasoner_config['api_base_url']}/{reasoner_config['api_request_address']}",
-                openai_api_url=f"{target_config['api_base_url']}/{target_config['api_request_address']}",
-                is_origin_reasoning=reasoner_config.get("is_origin_reasoning", self.is_origin_reasoning),
+                deepseek_api_url=reasoner_api_url,
+                openai_api_url=target_api_url,
+                is_origin_reasoning=is_origin_reasoning,
                 reasoner_proxy=reasoner_proxy,
                 target_proxy=target_proxy,
                 system_config=system_config,
             )
         
-        # 缓存实例
-        self.model_instances[model_name] = instance
         return instance
 
+    def warmup(self) -> None:
+        """预热模型实例
+
+        服务启动时提前创建所有可用组合模型的实例，并在后台线程中加载 tiktoken 编码器，
+        避免首个请求承担这些初始化开销。编码器首次加载可能需要下载 BPE 文件，不能阻塞服务启动
+        """
+        warmed = 0
+        config_version = self._config_version
+        composite_models = self.config.get("composite_models", {})
+        if not isinstance(composite_models, dict):
+            logger.warning("composite_models 配置格式无效，跳过模型预热")
+            composite_models = {}
+        for model_name, config in composite_models.items():
+            try:
+                if not isinstance(config, dict) or not config.get("is_valid", False):
+                    continue
+                reasoner_config, target_config = self.get_model_details(model_name)
+                self._get_model_instance(model_name, reasoner_config, target_config, config_version)
+                warmed += 1
+            except ValueError as e:
+                # 推理模型或目标模型未启用，请求时同样会被拒绝，无需警告
+                logger.debug(f"跳过预热模型 {model_name}: {e}")
+            except Exception as e:
+                logger.warning(f"预热模型 {model_name} 失败: {e}")
+
+        threading.Thread(target=self._preload_encoding, name="tiktoken-preload", daemon=True).start()
+
+        logger.info(f"模型预热完成，共创建 {warmed} 个模型实例")
+
+    @staticmethod
+    def _preload_encoding() -> None:
+        """预加载非流式请求计算 token 使用的 tiktoken 编码器"""
+        try:
+            get_encoding("gpt-4o")
+        except Exception as e:
+            logger.warning(f"预加载 tiktoken 编码器失败: {e}")
+
     def validate_and_prepare_params(self, body: Dict[str, Any]) -> Tuple[List[Dict[str, str]], str, Tuple[float, float, float, float, bool]]:
         """验证和准备请求参数
 
@@ -196,7 +402,13 @@ class ModelManager:
 
         # 模型特定验证
         if "sonnet" in model:  # Sonnet 模型温度必须在 0 到 1 之间
-            if not isinstance(temperature, (float, int)) or temperature < 0.0 or temperature > 1.0:
+            # bool 是 int 的子类，需单独排除，避免 true/false 被当作 1/0 通过校验
+            if (
+                isinstance(temperature, bool)
+                or not isinstance(temperature, (float, int))
+                or temperature < 0.0
+                or temperature > 1.0
+            ):
                 raise ValueError("Sonnet 设定 temperature 必须在 0 到 1 之间")
 
         return messages, model, (temperature, top_p, presence_penalty, frequency_penalty, stream)
@@ -207,6 +419,12 @@ class ModelManager:
         Returns:
             List[Dict[str, Any]]: 模型列表
         """
+        # 配置未变更时直接返回缓存的模型列表
+        version = self._config_version
+        cached = self._model_list_cache
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
         models = []
         for model_id, config in self.config.get("composite_models", {}).items():
             if config.get("is_valid", False):
@@ -232,6 +450,7 @@ class ModelManager:
                     "root": "deepclaude",
                     "parent": None
                 })
+        self._model_list_cache = (version, models)
         return models
 
     async def process_request(self, body: Dict[str, Any]) -> Any:
@@ -241,7 +460,7 @@ class ModelManager:
             body: 请求体
 
         Returns:
-            Any: 响应对象，可能是 StreamingResponse 或 Dict
+            Any: 响应对象，可能是 StreamingResponse 或 JSONResponse
 
         Raises:
             ValueError: 参数验证或处理失败时抛出
@@ -253,51 +472,59 @@ class ModelManager:
         # 模型参数，不包含 stream
         model_params = (temperature, top_p, presence_penalty, frequency_penalty)
 
-        # 获取模型详细配置
+        # 获取模型详细配置，版本号需先于配置读取
+        config_version = self._config_version
         reasoner_config, target_config = self.get_model_details(model)
 
+        # 开启响应缓存时，相同的非流式请求直接复用缓存的响应
+        # 缓存键需在调用模型前计算，模型处理过程中会修改消息内容
+        system_config = self.config.get("system", {})
+        cache_key = None
+        if not stream and _is_enabled(system_config.get("response_cache", False)):
+            cache_key = ResponseCache.make_key(model, messages, model_params, config_version)
+            cached_response = self._response_cache.get(cache_key)
+            if cached_response is not None:
+                logger.info(f"模型 {model} 命中响应缓存")
+                return JSONResponse({
+                    **cached_response,
+                    "id": new_chat_id(),
+                    "created": int(time.time()),
+                })
+            # 兼容手动编辑配置时写成字符串的有效期，在调用模型前解析，避免解析失败丢弃已完成的回答
+            try:
+                cache_ttl = float(system_config.get("response_cache_ttl", 300))
+            except (TypeError, ValueError):
+                logger.warning("response_cache_ttl 配置无效，使用默认值 300 秒")
+                cache_ttl = 300
+
         # 获取模型实例
-        model_instance = self._get_model_instance(model)
+        model_instance = self._get_model_instance(model, reasoner_config, target_config, config_version)
 
-        # 处理请求
+        # DeepClaude 与 OpenAI 兼容组合模型仅目标模型的参数名不同
         if target_config.get("model_format", "") == "anthropic":
-            # 使用 DeepClaude
-            if stream:
-                return StreamingResponse(
-                    model_instance.chat_completions_with_stream(
-                        messages=messages,
-                        model_arg=model_params,
-                        deepseek_model=reasoner_config["model_id"],
-                        claude_model=target_config["model_id"],
-                    ),
-                    media_type="text/event-stream",
-                )
-            else:
-                return await model_instance.chat_completions_without_stream(
-                    messages=messages,
-                    model_arg=model_params,
-                    deepseek_model=reasoner_config["model_id"],
-                    claude_model=target_config["model_id"],
-                )
+            target_model_arg = "claude_model"
         else:
-            # 使用 OpenAI 兼容组合模型
-            if stream:
-                return StreamingResponse(
-                    model_instance.chat_completions_with_stream(
-                        messages=messages,
-                        model_arg=model_params,
-                        deepseek_model=reasoner_config["model_id"],
-                        target_model=target_config["model_id"],
-                    ),
-                    media_type="text/event-stream",
-                )
-            else:
-                return await model_instance.chat_completions_without_stream(
-                    messages=messages,
-                    model_arg=model_params,
-                    deepseek_model=reasoner_config["model_id"],
-                    target_model=target_config["model_id"],
-                )
+            target_model_arg = "target_model"
+        request_kwargs = {
+            "messages": messages,
+            "model_arg": model_params,
+            "deepseek_model": reasoner_config["model_id"],
+            target_model_arg: target_config["model_id"],
+        }
+
+        # 处理请求
+        if stream:
+            return StreamingResponse(
+                model_instance.chat_completions_with_stream(**request_kwargs),
+                media_type="text/event-stream",
+            )
+        response = await model_instance.chat_completions_without_stream(**request_kwargs)
+
+        # 只缓存正常完成的响应，推理失败或上游中断得到的回答不缓存
+        if cache_key is not None and cache_ttl > 0 and _is_complete_response(response):
+            self._response_cache.put(cache_key, response, cache_ttl)
+        # 直接返回 JSONResponse，跳过 FastAPI 对返回值的 jsonable_encoder 递归转换
+        return JSONResponse(response)
 
 
     def get_config(self) -> Dict[str, Any]:
@@ -306,9 +533,8 @@ class ModelManager:
         Returns:
             Dict[str, Any]: 当前配置
         """
-        # 每次都从文件重新加载最新配置
-        self.config = self._load_config()
-        return self.config
+        # 快照过期时才从文件重新加载最新配置
+        return self._refresh_config()
 
     def update_config(self, config: Dict[str, Any]) -> None:
         """更新配置
@@ -323,15 +549,30 @@ class ModelManager:
         if not isinstance(config, dict):
             raise ValueError("配置必须是字典")
         
-        # 更新配置
-        self.config = config
-        
-        # 清空模型实例缓存，以便重新创建
-        self.model_instances = {}
-        
-        # 保存配置到文件
+        with self._config_lock:
+            # 配置未变化且文件未被外部修改时，跳过写入并保留已有的实例和缓存
+            if config == self.config and self._get_config_mtime() == self._config_mtime:
+                logger.debug("配置未变化，跳过保存")
+                return
+            
+            # 先保存配置到文件，写入失败时内存中的配置和缓存保持不变
+            self._save_config(config)
+            
+            # 更新配置，并清空模型实例和其他派生缓存，以便按新配置重新创建
+            self._apply_config(config, self._get_config_mtime())
+
+    def _save_config(self, config: Dict[str, Any]) -> None:
+        """将配置一次性写入配置文件
+
+        先完整序列化再打开文件写入，序列化失败时不会截断原配置文件。
+        配置文件在 Docker 中以单文件方式挂载，因此不使用临时文件替换的方式
+
+        Args:
+            config: 要保存的配置
+        """
+        content = json.dumps(config, ensure_ascii=False, indent=4)
         with open(self.config_path, "w", encoding="utf-8") as f:
-            json.dump(config, f, ensure_ascii=False, indent=4)
+            f.write(content)
 
     def validate_config(self, config: Dict[str, Any]) -> Tuple[bool, str]:
         """验证配置文件的完整性和有效性
@@ -411,17 +652,14 @@ class ModelManager:
         """导出当前配置
         
         Returns:
-            Dict[str, Any]: 当前配置的完整副本
+            Dict[str, Any]: 当前配置及导出元数据
         """
-        # 重新加载最新配置
-        self.config = self._load_config()
+        # 快照过期时重新加载最新配置
+        config = self._refresh_config()
         
-        # 返回配置的深拷贝，避免外部修改影响内部状态
-        import copy
-        exported_config = copy.deepcopy(self.config)
-        
-        # 添加导出元数据
-        from datetime import datetime
+        # 导出结果只用于序列化，浅拷贝顶层字典后添加导出元数据即可，
+        # 不会修改内部配置，也避免了深拷贝整个配置
+        exported_config = dict(config)
         exported_config["_export_metadata"] = {
             "export_time": datetime.now().isoformat(),
             "version": "1.0",
@@ -439,11 +677,11 @@ class ModelManager:
         Raises:
             ValueError: 配置无效或验证失败
         """
-        # 移除导出元数据（如果存在）
-        import copy
-        clean_config = copy.deepcopy(config)
-        if "_export_metadata" in clean_config:
-            del clean_config["_export_metadata"]
+        if not isinstance(config, dict):
+            raise ValueError("配置必须是字典")
+        
+        # 移除导出元数据（如果存在），请求体是新解析出的对象，浅拷贝即可
+        clean_config = {key: value for key, value in config.items() if key != "_export_metadata"}
         
         # 验证配置
         is_valid, error_msg = self.validate_config(clean_config)
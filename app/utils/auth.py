@@ -1,5 +1,6 @@
 from fastapi import HTTPException, Header, Request
 from typing import Optional
+import hmac
 import os
 from dotenv import load_dotenv
 from app.utils.logger import logger
@@ -20,7 +21,7 @@ def get_api_key():
             detail="API key not configured"
         )
     # 打印API密钥的前4位用于调试
-    logger.info(f"Loaded API key from config: {api_key[:4] if len(api_key) >= 4 else api_key}")
+    logger.debug("Loaded API key from config: %s", api_key[:4])
     
     return api_key
 
@@ -44,12 +45,13 @@ async def verify_api_key(authorization: Optional[str] = Header(None)) -> None:
     # 获取最新的 API Key
     current_api_key = get_api_key()
     
-    api_key = authorization.replace("Bearer ", "").strip()
-    if api_key != current_api_key:
+    api_key = authorization.removeprefix("Bearer ").strip()
+    # 使用常量时间比较，避免通过响应耗时推测密钥
+    if not hmac.compare_digest(api_key.encode("utf-8"), current_api_key.encode("utf-8")):
         logger.warning(f"无效的API密钥: {api_key}")
         raise HTTPException(
             status_code=401,
             detail="Invalid API key"
         )
     
-    logger.info("API密钥验证通过")
+    logger.debug("API密钥验证通过")
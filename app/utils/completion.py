@@ -0,0 +1,102 @@
+"""OpenAI 格式响应的构造工具"""
+
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict
+
+# 会话ID的进程内自增计数
+_chat_id_counter = itertools.count()
+
+# 未能获取推理内容时使用的占位推理，基于它生成的回答不完整
+REASONING_FAILED = "获取推理内容失败"
+
+# 响应骨架中的内容占位符，序列化后会被拆分为前后缀
+CHUNK_CONTENT = "\x00"
+_CHUNK_CONTENT_JSON = json.dumps(CHUNK_CONTENT)
+
+
+def new_chat_id() -> str:
+    """生成会话ID
+
+    由进程内自增计数和单调时钟的低位组成，同一毫秒内的多个请求也不会重复
+
+    Returns:
+        str: 形如 chatcmpl-xxx 的会话ID
+    """
+    return f"chatcmpl-{next(_chat_id_counter):x}{time.monotonic_ns() & 0xFFFFFF:06x}"
+
+
+def make_chunk_encoder(
+    chat_id: str, created_time: int, model: str, delta: Dict[str, Any]
+) -> Callable[[str], bytes]:
+    """预先序列化流式响应的固定部分，返回只需编码内容的 SSE 数据块构造函数
+
+    Args:
+        chat_id: 会话ID
+        created_time: 创建时间戳
+        model: 模型名称
+        delta: delta 字段模板，其中值为 CHUNK_CONTENT 的字段会被替换为实际内容
+
+    Returns:
+        Callable[[str], bytes]: 接收内容并返回完整 SSE 数据块的函数，
+            输出与直接 json.dumps 整个响应完全一致
+    """
+    response = {
+        "id": chat_id,
+        "object": "chat.completion.chunk",
+        "created": created_time,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta}],
+    }
+    prefix, suffix = json.dumps(response).split(_CHUNK_CONTENT_JSON)
+    prefix_bytes = f"data: {prefix}".encode("utf-8")
+    suffix_bytes = f"{suffix}\n\n".encode("utf-8")
+
+    def encode(content: str) -> bytes:
+        return prefix_bytes + json.dumps(content).encode("utf-8") + suffix_bytes
+
+    return encode
+
+
+def build_error_chunk(chat_id: str, created_time: int, model: str, error: Exception) -> bytes:
+    """构造流式错误响应数据块，并将常见的上游错误转换为友好的提示
+
+    Args:
+        chat_id: 会话ID
+        created_time: 创建时间戳
+        model: 模型名称
+        error: 捕获到的异常
+
+    Returns:
+        bytes: SSE 格式的错误数据块
+    """
+    error_message = str(error)
+    error_info = {
+        "message": error_message,
+        "type": "api_error",
+        "code": "invalid_request_error"
+    }
+
+    # 处理常见的错误信息
+    if "Input length" in error_message:
+        error_info["message"] = "输入的上下文内容过长，超过了模型的最大处理长度限制。请减少输入内容或分段处理。"
+        error_info["message_zh"] = "输入的上下文内容过长，超过了模型的最大处理长度限制。请减少输入内容或分段处理。"
+        error_info["message_en"] = error_message
+    elif "InvalidParameter" in error_message:
+        error_info["message"] = "请求参数无效，请检查输入内容。"
+        error_info["message_zh"] = "请求参数无效，请检查输入内容。"
+        error_info["message_en"] = error_message
+    elif "BadRequest" in error_message:
+        error_info["message"] = "请求格式错误，请检查输入内容。"
+        error_info["message_zh"] = "请求格式错误，请检查输入内容。"
+        error_info["message_en"] = error_message
+
+    error_response = {
+        "id": chat_id,
+        "object": "chat.completion.chunk",
+        "created": created_time,
+        "model": model,
+        "error": error_info
+    }
+    return f"data: {json.dumps(error_response)}\n\n".encode("utf-8")
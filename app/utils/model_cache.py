@@ -0,0 +1,125 @@
+"""模型实例缓存和响应缓存，负责复用已创建的模型实例和相同请求的响应"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class ModelInstanceCache:
+    """模型实例 LRU 缓存，保证同一个模型只会创建一个实例"""
+
+    __slots__ = ("max_size", "instances", "_lock")
+
+    def __init__(self, max_size: int = 16):
+        """初始化模型实例缓存
+
+        Args:
+            max_size: 最多缓存的实例数量，超出时淘汰最久未使用的实例
+        """
+        self.max_size = max_size
+        self.instances: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, model_key: Hashable, factory: Callable[[], Any]) -> Any:
+        """获取模型实例，不存在时调用 factory 创建并缓存
+
+        Args:
+            model_key: 模型缓存键，可以是任意可哈希对象
+            factory: 创建模型实例的函数
+
+        Returns:
+            Any: 模型实例
+        """
+        with self._lock:
+            # 在锁内检查和创建，避免并发请求重复创建实例
+            instance = self.instances.get(model_key)
+            if instance is not None:
+                self.instances.move_to_end(model_key)
+                return instance
+
+            instance = factory()
+            self.instances[model_key] = instance
+            if len(self.instances) > self.max_size:
+                self.instances.popitem(last=False)
+            return instance
+
+    def clear(self) -> None:
+        """清空所有缓存的模型实例"""
+        with self._lock:
+            self.instances.clear()
+
+
+class ResponseCache:
+    """带过期时间的非流式响应 LRU 缓存"""
+
+    __slots__ = ("max_size", "entries", "_lock")
+
+    def __init__(self, max_size: int = 256):
+        """初始化响应缓存
+
+        Args:
+            max_size: 最多缓存的响应数量，超出时淘汰最久未使用的响应
+        """
+        self.max_size = max_size
+        self.entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]], model_arg: tuple, config_version: int) -> bytes:
+        """根据模型、消息、模型参数和配置版本号生成缓存键
+
+        Args:
+            model: 模型名称
+            messages: 消息列表
+            model_arg: 模型参数
+            config_version: 生成响应时的配置版本号，配置变更后旧响应不会再被命中
+
+        Returns:
+            bytes: 缓存键
+        """
+        payload = json.dumps([model, messages, model_arg, config_version], sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        """获取未过期的缓存响应
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[Dict[str, Any]]: 缓存的响应，不存在或已过期时返回 None
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, response = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return response
+
+    def put(self, key: bytes, response: Dict[str, Any], ttl: float) -> None:
+        """缓存响应
+
+        Args:
+            key: 缓存键
+            response: 完整的响应数据
+            ttl: 有效期(秒)
+        """
+        with self._lock:
+            self.entries[key] = (time.monotonic() + ttl, response)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空所有缓存的响应"""
+        with self._lock:
+            self.entries.clear()